@@ -1,71 +1,85 @@
 import glob
 import os
-from datetime import datetime
 
 import matplotlib.pyplot as plt
-import pandas as pd
+
+from history_io import (
+    competition_index,
+    history_cache_key,
+    invalid_snapshot_file,
+    parse_snapshot_times,
+    read_history_cache,
+    scan_history,
+    write_history_cache,
+)
 
 DATA_DIR = r"C:\Users\user\Documents\GitHub\ranking\twitch-ranking\data"
 
+# 結合済み履歴の Parquet キャッシュ（名前と形式バージョンの扱いは history_io を参照）
+HISTORY_CACHE_NAME = "_analyze_history"
+HISTORY_CACHE_VERSION = 4
 
 
 def load_history(data_dir=DATA_DIR):
     """
     data/ 配下の twitch_ranking_*.csv を全部読み込んで
     1つの DataFrame にまとめる
+    戻り値は snapshot 昇順に並んでいる（後続の関数はこの並びを前提にしてよい）
     """
     pattern = os.path.join(data_dir, "twitch_ranking_*.csv")
     files = sorted(glob.glob(pattern))
 
-    records = []
+    if not files:
+        raise RuntimeError("data/ に履歴CSVがありません。まず収集スクリプトを動かして。")
 
-    for path in files:
-        filename = os.path.basename(path)
-        # twitch_ranking_YYYY-MM-DD_HH-MM.csv から日時部分を抜く
-        tag = filename.replace("twitch_ranking_", "").replace(".csv", "")
-        snapshot = datetime.strptime(tag, "%Y-%m-%d_%H-%M")
+    cache_key = history_cache_key(files, [os.path.getmtime(path) for path in files], HISTORY_CACHE_VERSION)
+    all_df = read_history_cache(data_dir, HISTORY_CACHE_NAME, cache_key)
+    if all_df is not None:
+        return all_df
 
-        df = pd.read_csv(path)
-        # rank,name,streamers,viewers,avg_viewers_per_stream
-        df["snapshot"] = snapshot
-        records.append(df)
+    # twitch_ranking_YYYY-MM-DD_HH-MM.csv から日時部分を抜いてまとめて解析
+    parsed = parse_snapshot_times(files)
+    filename = invalid_snapshot_file(files, parsed)
+    if filename is not None:
+        raise RuntimeError(f"ファイル名 {filename} の日時を解釈できません（twitch_ranking_YYYY-MM-DD_HH-MM.csv の形式にして）")
 
-    if not records:
-        raise RuntimeError("data/ に履歴CSVがありません。まず収集スクリプトを動かして。")
+    all_df = scan_history(files, parsed)
 
-    all_df = pd.concat(records, ignore_index=True)
+    write_history_cache(all_df, data_dir, HISTORY_CACHE_NAME, cache_key)
     return all_df
 
 
 def prepare_metrics(df):
     """
-    基本的なメトリクス列を整える
+    基本的なメトリクス列を整える（df に列を追加してそのまま返す）
+    snapshot は load_history で datetime64 になっている前提
     """
-    df = df.copy()
-    df["snapshot"] = pd.to_datetime(df["snapshot"])
-    df["competition_index"] = df.apply(
-        lambda r: r["viewers"] / r["streamers"] if r["streamers"] > 0 else 0, axis=1
-    )
+    df["competition_index"] = competition_index(df)
     return df
 
 
+def latest_top_names(df, n):
+    """
+    最新スナップショットで視聴者数上位 n カテゴリの名前リスト
+    """
+    is_latest = df["snapshot"].to_numpy() == df["snapshot"].max().to_datetime64()
+    return df.loc[is_latest].nlargest(n, "viewers")["name"].tolist()
+
+
 def plot_viewers_trend_top10(df, output="viewers_trend_top10.png"):
     """
     視聴者数トップ10カテゴリの視聴者数推移ラインチャート
     """
-    latest_snap = df["snapshot"].max()
-    latest = df[df["snapshot"] == latest_snap]
-    top10_names = (
-        latest.sort_values("viewers", ascending=False)
-        .head(10)["name"]
-        .tolist()
-    )
+    top10_names = latest_top_names(df, 10)
 
     sub = df[df["name"].isin(top10_names)]
+    # カテゴリごとに毎回全行を比較せず、1回の groupby で行位置を引けるようにしておく
+    groups = sub.groupby("name", observed=True)
 
     plt.figure(figsize=(14, 6))
     for name in top10_names:
-        tmp = sub[sub["name"] == name].sort_values("snapshot")
+        # get_group は元の行順を保つので、snapshot 順のまま取り出せる
+        tmp = groups.get_group(name)
         plt.plot(tmp["snapshot"], tmp["viewers"], marker="o", label=name)
 
     plt.xlabel("Time")
@@ -83,22 +97,16 @@ def make_heatmap_data_top50(df, output_csv="heatmap_top50_viewers.csv"):
     ヒートマップ用に TOP50カテゴリ × 時間 の視聴者数をピボットしたCSVを吐く
     （グラフは自分でExcel / スプシ / Pythonで描けるようにする）
     """
-    latest_snap = df["snapshot"].max()
-    latest = df[df["snapshot"] == latest_snap]
-    top50_names = (
-        latest.sort_values("viewers", ascending=False)
-        .head(50)["name"]
-        .tolist()
-    )
+    top50_names = latest_top_names(df, 50)
 
-    sub = df[df["name"].isin(top50_names)]
+    # ピボットに使う3列だけ切り出してコピー量を抑える
+    sub = df.loc[df["name"].isin(top50_names), ["name", "snapshot", "viewers"]]
     # 行: カテゴリ, 列: snapshot, 値: viewers
-    pivot = sub.pivot_table(
-        index="name",
-        columns="snapshot",
-        values="viewers",
-        aggfunc="sum",
-        fill_value=0,
+    # 同じスナップショットに同名カテゴリが重複することがあるので合算してから横持ちにする
+    pivot = (
+        sub.groupby(["name", "snapshot"], observed=True)["viewers"]
+        .sum()
+        .unstack("snapshot", fill_value=0)
     )
 
     pivot.to_csv(output_csv, encoding="utf-8-sig")
@@ -110,40 +118,26 @@ def detect_struggling_categories(df, output_csv="struggling_categories.csv"):
     「配信者数は増えたのに視聴者数は減ったカテゴリ」を抽出
     -> 伸び悩みカテゴリとして出力
     """
-    df = df.sort_values("snapshot")
-
-    result_rows = []
-    for name, g in df.groupby("name"):
-        first = g.iloc[0]
-        last = g.iloc[-1]
-
-        streamers_first = first["streamers"]
-        streamers_last = last["streamers"]
-        viewers_first = first["viewers"]
-        viewers_last = last["viewers"]
-
-        if streamers_last > streamers_first and viewers_last < viewers_first:
-            result_rows.append(
-                {
-                    "name": name,
-                    "first_snapshot": first["snapshot"],
-                    "last_snapshot": last["snapshot"],
-                    "streamers_first": streamers_first,
-                    "streamers_last": streamers_last,
-                    "viewers_first": viewers_first,
-                    "viewers_last": viewers_last,
-                    "delta_streamers": streamers_last - streamers_first,
-                    "delta_viewers": viewers_last - viewers_first,
-                }
-            )
-
-    if not result_rows:
+    # カテゴリごとの初回・最新レコードを 1 回の groupby でまとめて取る（df は snapshot 順）
+    out_df = df.groupby("name", observed=True).agg(
+        first_snapshot=("snapshot", "first"),
+        last_snapshot=("snapshot", "last"),
+        streamers_first=("streamers", "first"),
+        streamers_last=("streamers", "last"),
+        viewers_first=("viewers", "first"),
+        viewers_last=("viewers", "last"),
+    )
+    out_df["delta_streamers"] = out_df["streamers_last"] - out_df["streamers_first"]
+    out_df["delta_viewers"] = out_df["viewers_last"] - out_df["viewers_first"]
+
+    struggling = (out_df["delta_streamers"] > 0) & (out_df["delta_viewers"] < 0)
+
+    if not struggling.any():
         print("伸び悩みカテゴリは検出されませんでした。")
         return
 
-    out_df = pd.DataFrame(result_rows).sort_values(
-        ["delta_viewers", "delta_streamers"], ascending=[True, False]
-    )
+    out_df = out_df[struggling].rename_axis("name").reset_index()
+    out_df = out_df.sort_values(["delta_viewers", "delta_streamers"], ascending=[True, False])
     out_df.to_csv(output_csv, index=False, encoding="utf-8-sig")
     print(f"⚠ 伸び悩みカテゴリ一覧CSV保存: {output_csv}")
 
@@ -1,138 +1,158 @@
 import glob
 import os
-from datetime import datetime
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 import plotly.express as px
+import plotly.io as pio
+
+from history_io import (
+    competition_index,
+    history_cache_key,
+    invalid_snapshot_file,
+    parse_snapshot_times,
+    read_history_cache,
+    scan_history,
+    write_history_cache,
+)
+
+# st.plotly_chart が毎回行う図の JSON 化を orjson で速くする
+pio.json.config.default_engine = "orjson"
 
 # このファイル(dashboard.py)が置いてあるフォルダを基準に data を見る
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
+# 結合済み履歴の Parquet キャッシュ（名前と形式バージョンの扱いは history_io を参照）
+HISTORY_CACHE_NAME = "_dashboard_history"
+HISTORY_CACHE_VERSION = 5
+
+# CSV が増えるたびに古いキーのキャッシュが残り続けないよう、一定時間で捨てる
+CACHE_TTL_SECONDS = 3600
+
+# 推移グラフに渡す最大点数（これを超えたら LTTB で間引く）
+TREND_MAX_POINTS = 500
+
+
+def _file_signature():
+    """履歴CSVの (パス, 更新時刻) 一覧。load_history のキャッシュキーに使う"""
+    pattern = os.path.join(DATA_DIR, "twitch_ranking_*.csv")
+    return tuple((path, os.path.getmtime(path)) for path in sorted(glob.glob(pattern)))
+
 
-def load_history():
-    """data/ 以下の Twitch 履歴データをまとめて読み込む"""
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner="履歴データを読み込み中…")
+def load_history(signature):
+    """data/ 以下の Twitch 履歴データをまとめて読み込む
+
+    signature は _file_signature() の戻り値。CSV が増減・更新されたときだけ読み直す。
+    戻り値の DataFrame は snapshot 昇順に並んでいる（後続の関数はこの並びを前提にしてよい）。
+    """
 
     if not os.path.isdir(DATA_DIR):
         return None, "data フォルダが見つかりません。ダッシュボードと同じ階層に data/ を置いてください。"
 
-    pattern = os.path.join(DATA_DIR, "twitch_ranking_*.csv")
-    files = sorted(glob.glob(pattern))
+    files = [path for path, _ in signature]
 
     if not files:
         return None, "data/ フォルダに twitch_ranking_*.csv がありません。履歴CSVを GitHub にアップしてください。"
 
-    records = []
-    for path in files:
-        filename = os.path.basename(path)
-        tag = filename.replace("twitch_ranking_", "").replace(".csv", "")
-
-        try:
-            snapshot = datetime.strptime(tag, "%Y-%m-%d_%H-%M")
-        except ValueError:
-            return None, f"ファイル名 {filename} の日時部分が想定外です。（twitch_ranking_YYYY-MM-DD_HH-MM.csv の形式にしてください）"
-
-        df = pd.read_csv(path)
+    cache_key = history_cache_key(files, [mtime for _, mtime in signature], HISTORY_CACHE_VERSION)
+    df_all = read_history_cache(DATA_DIR, HISTORY_CACHE_NAME, cache_key)
+    if df_all is not None:
+        return df_all, None
 
-        required_cols = {"rank", "name", "streamers", "viewers"}
-        missing = required_cols - set(df.columns)
-        if missing:
-            return None, f"CSV {filename} に必要なカラム {missing} がありません。収集スクリプト側の出力形式を確認してください。"
+    # ファイル名の日時部分をまとめて解析（twitch_ranking_YYYY-MM-DD_HH-MM.csv）
+    parsed = parse_snapshot_times(files)
 
-        df["snapshot"] = snapshot
-        records.append(df)
+    filename = invalid_snapshot_file(files, parsed)
+    if filename is not None:
+        return None, f"ファイル名 {filename} の日時部分が想定外です。（twitch_ranking_YYYY-MM-DD_HH-MM.csv の形式にしてください）"
 
-    df_all = pd.concat(records, ignore_index=True)
-    df_all["snapshot"] = pd.to_datetime(df_all["snapshot"])
+    try:
+        df_all = scan_history(files, parsed)
+    except pa.ArrowInvalid as e:
+        return None, f"履歴CSVの読み込みに失敗しました。収集スクリプト側の出力形式を確認してください。（{e}）"
+    except ValueError as e:
+        # 必要なカラムが無い CSV（メッセージは scan_history 側で組み立て済み）
+        return None, str(e)
 
     # ★ rank を数値化して 0 始まりなら 1 始まりに補正
-    df_all["rank"] = pd.to_numeric(df_all["rank"], errors="coerce").fillna(0).astype(int)
+    df_all["rank"] = pd.to_numeric(df_all["rank"], errors="coerce").fillna(0).astype(np.int32)
     if df_all["rank"].min() == 0:
         df_all["rank"] = df_all["rank"] + 1
 
     # 競争率（視聴者 ÷ 配信者）
-    df_all["competition_index"] = df_all["viewers"] / df_all["streamers"].replace(0, 1)
+    df_all["competition_index"] = competition_index(df_all)
 
-    return df_all, None
-
-    """data/ 以下の Twitch 履歴データをまとめて読み込む"""
+    write_history_cache(df_all, DATA_DIR, HISTORY_CACHE_NAME, cache_key)
 
-    if not os.path.isdir(DATA_DIR):
-        return None, "data フォルダが見つかりません。ダッシュボードと同じ階層に data/ を置いてください。"
-
-    pattern = os.path.join(DATA_DIR, "twitch_ranking_*.csv")
-    files = sorted(glob.glob(pattern))
-
-    if not files:
-        return None, "data/ フォルダに twitch_ranking_*.csv がありません。履歴CSVを GitHub にアップしてください。"
+    return df_all, None
 
-    records = []
-    for path in files:
-        filename = os.path.basename(path)
-        tag = filename.replace("twitch_ranking_", "").replace(".csv", "")
 
-        # ファイル名の日時部分を解析（twitch_ranking_YYYY-MM-DD_HH-MM.csv）
-        try:
-            snapshot = datetime.strptime(tag, "%Y-%m-%d_%H-%M")
-        except ValueError:
-            return None, f"ファイル名 {filename} の日時部分が想定外です。（twitch_ranking_YYYY-MM-DD_HH-MM.csv の形式にしてください）"
+def downsample_lttb(df: pd.DataFrame, y_col: str, n_out: int = TREND_MAX_POINTS) -> pd.DataFrame:
+    """snapshot 順の df を Largest-Triangle-Three-Buckets で n_out 行まで間引く
 
-        df = pd.read_csv(path)
+    山・谷の形を残したまま Plotly に渡す点数を抑える。n_out 以下ならそのまま返す。
+    """
+    n = len(df)
+    if n <= n_out:
+        return df
 
-        # 必須カラムチェック
-        required_cols = {"rank", "name", "streamers", "viewers"}
-        missing = required_cols - set(df.columns)
-        if missing:
-            return None, f"CSV {filename} に必要なカラム {missing} がありません。収集スクリプト側の出力形式を確認してください。"
+    x = df["snapshot"].to_numpy().astype("int64").astype(np.float64)
+    y = df[y_col].to_numpy(dtype=np.float64)
 
-        df["snapshot"] = snapshot
-        records.append(df)
+    # 先頭・末尾は必ず残し、間の点を n_out - 2 個のバケツに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
 
-    df_all = pd.concat(records, ignore_index=True)
-    df_all["snapshot"] = pd.to_datetime(df_all["snapshot"])
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
 
-    # ★ 追加：rankを数値化＆0始まりなら1足して補正
-    df_all["rank"] = pd.to_numeric(df_all["rank"], errors="coerce").fillna(0).astype(int)
-    if df_all["rank"].min() == 0:
-        df_all["rank"] = df_all["rank"] + 1
-
-    # 競争率（視聴者 ÷ 配信者）
-    df_all["competition_index"] = df_all["viewers"] / df_all["streamers"].replace(0, 1)
+        # 直前に選んだ点・次バケツの平均点と作る三角形が最大になる点を選ぶ
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        idx[i + 1] = a
 
-    return df_all, None
-    df_all["snapshot"] = pd.to_datetime(df_all["snapshot"])
+    return df.iloc[idx]
 
-    # 競争率（視聴者 ÷ 配信者）
-    df_all["competition_index"] = df_all["viewers"] / df_all["streamers"].replace(0, 1)
-    
-    return df_all, None
 
+def classify_growth_type(summary: pd.DataFrame) -> np.ndarray:
+    """視聴者増加率・ランク改善量から成長タイプをざっくり分類（全カテゴリまとめて判定）"""
+    growth_rate = summary["視聴者増加率"].to_numpy()  # 初回→最新の割合
+    rank_improve = summary["ランク改善量"].to_numpy()  # 正ならランクUP
 
-def classify_growth_type(row) -> str:
-    """視聴者増加率・ランク改善・平均競争率から成長タイプをざっくり分類"""
-    growth_rate = row["視聴者増加率"]  # 初回→最新の割合
-    rank_improve = row["ランク改善量"]  # 正ならランクUP
-    avg_comp = row["平均競争率"]
-
-    # かなり強気な伸び
-    if growth_rate > 0.8 and rank_improve > 15:
-        return "🚀 急成長"
-    # しっかり右肩上がり
-    if growth_rate > 0.3 and rank_improve > 5:
-        return "📈 成長"
-    # ほぼ現状維持（微増〜微減）
-    if growth_rate > -0.1:
-        return "😐 横ばい"
+    # 上から順に最初に当てはまったものになる
+    conditions = [
+        # かなり強気な伸び
+        (growth_rate > 0.8) & (rank_improve > 15),
+        # しっかり右肩上がり
+        (growth_rate > 0.3) & (rank_improve > 5),
+        # ほぼ現状維持（微増〜微減）
+        growth_rate > -0.1,
+    ]
+    choices = ["🚀 急成長", "📈 成長", "😐 横ばい"]
     # 明確に落ちている
-    return "📉 下降"
+    return np.select(conditions, choices, default="📉 下降")
 
 
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
 def build_summary(df: pd.DataFrame) -> pd.DataFrame:
     """カテゴリごとの累計・平均・最大・成長情報などまとめたサマリを作る"""
 
-    # 基本集計＋ばらつき
-    agg = df.groupby("name").agg(
+    # 基本集計＋ばらつき＋初回・最新（df は snapshot 順なので 1 回の groupby で集計できる）
+    # competition_index は float32 で持っているので、平均は float64 に上げてから取る（表示の丸めがずれないように）
+    g = df.assign(competition_index=df["competition_index"].astype(np.float64)).groupby("name", observed=True)
+    summary = g.agg(
         累計視聴者数=("viewers", "sum"),
         累計配信者数=("streamers", "sum"),
         平均視聴者数=("viewers", "mean"),
@@ -140,62 +160,38 @@ def build_summary(df: pd.DataFrame) -> pd.DataFrame:
         サンプル数=("viewers", "count"),
         平均競争率=("competition_index", "mean"),
         視聴者数標準偏差=("viewers", "std"),
+        初回取得日時=("snapshot", "first"),
+        初回視聴者数=("viewers", "first"),
+        初回配信者数=("streamers", "first"),
+        初回ランク=("rank", "first"),
+        最新取得日時=("snapshot", "last"),
+        最新視聴者数=("viewers", "last"),
+        最新配信者数=("streamers", "last"),
+        最新ランク=("rank", "last"),
     )
 
-    # 初回
-    first = (
-        df.sort_values("snapshot")
-        .groupby("name")
-        .first()[["snapshot", "viewers", "streamers", "rank"]]
-        .rename(
-            columns={
-                "snapshot": "初回取得日時",
-                "viewers": "初回視聴者数",
-                "streamers": "初回配信者数",
-                "rank": "初回ランク",
-            }
-        )
-    )
-
-    # 最新
-    last = (
-        df.sort_values("snapshot")
-        .groupby("name")
-        .last()[["snapshot", "viewers", "streamers", "rank"]]
-        .rename(
-            columns={
-                "snapshot": "最新取得日時",
-                "viewers": "最新視聴者数",
-                "streamers": "最新配信者数",
-                "rank": "最新ランク",
-            }
-        )
-    )
-
-    # ピーク（視聴者数が最大の瞬間）
-    peak_idx = df.groupby("name")["viewers"].idxmax()
-    peak = (
-        df.loc[peak_idx, ["name", "snapshot", "viewers"]]
-        .set_index("name")
-        .rename(columns={"snapshot": "ピーク日時", "viewers": "ピーク視聴者数"})
-    )
-
-    summary = agg.join(first).join(last).join(peak)
+    # ピーク（視聴者数が最大の瞬間）。同じ groupby から行を引いて列として足す（join しない）
+    peak_idx = g["viewers"].idxmax()
+    summary["ピーク日時"] = df.loc[peak_idx, "snapshot"].to_numpy()
+    summary["ピーク視聴者数"] = summary["最大視聴者数"]
 
     # 派生指標
     summary["視聴者数増加量"] = summary["最新視聴者数"] - summary["初回視聴者数"]
     summary["ランク改善量"] = summary["初回ランク"] - summary["最新ランク"]  # 正数ならランクUP
-    summary["視聴者増加率"] = summary["視聴者数増加量"] / summary["初回視聴者数"].replace(0, 1)
+    # 0 割り防止は Series を作り直さず、配列のまま 0 → 1 に置き換える
+    first_viewers = summary["初回視聴者数"].to_numpy()
+    first_rank = summary["初回ランク"].to_numpy()
+    summary["視聴者増加率"] = summary["視聴者数増加量"].to_numpy() / np.where(first_viewers == 0, 1, first_viewers)
 
     # 成長スコア（ざっくり：増加率＋ランク改善＋競争率を混ぜたもの）
     summary["成長スコア"] = (
         summary["視聴者増加率"] * 50
-        + (summary["ランク改善量"] / summary["初回ランク"].replace(0, 1)) * 30
+        + (summary["ランク改善量"].to_numpy() / np.where(first_rank == 0, 1, first_rank)) * 30
         + summary["平均競争率"] * 2
     )
 
     # 成長タイプラベル
-    summary["成長タイプ"] = summary.apply(classify_growth_type, axis=1)
+    summary["成長タイプ"] = classify_growth_type(summary)
 
     # 小数処理
     summary["平均視聴者数"] = summary["平均視聴者数"].round(1)
@@ -205,15 +201,160 @@ def build_summary(df: pd.DataFrame) -> pd.DataFrame:
     summary["成長スコア"] = summary["成長スコア"].round(2)
 
     summary = summary.reset_index().rename(columns={"name": "カテゴリ"})
+    # 表示・フィルタ側は普通の文字列で扱う
+    summary["カテゴリ"] = summary["カテゴリ"].astype(str)
 
     return summary
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_trend_figures(df_cat: pd.DataFrame, category: str):
+    """カテゴリ詳細の視聴者数推移・配信者数＆競争率推移グラフを作る
+
+    同じカテゴリを選び直したときは作り直さずキャッシュから返す。
+    スナップショットが増えても重くならないよう、間引いた上で WebGL で描画する。
+    """
+    fig_view = px.line(
+        downsample_lttb(df_cat, "viewers"),
+        x="snapshot",
+        y="viewers",
+        markers=True,
+        render_mode="webgl",
+        labels={"snapshot": "日時", "viewers": "視聴者数"},
+        title=f"{category} の視聴者数推移",
+    )
+    fig_view.update_layout(height=400)
+
+    # 配信者数と競争率は山・谷の位置が違うので、それぞれの列で間引いてから縦持ちにする
+    stream_traces = pd.concat(
+        [
+            downsample_lttb(df_cat, col)[["snapshot", col]].rename(columns={col: "value"}).assign(variable=col)
+            for col in ("streamers", "competition_index")
+        ],
+        ignore_index=True,
+    )
+    fig_stream = px.line(
+        stream_traces,
+        x="snapshot",
+        y="value",
+        color="variable",
+        markers=True,
+        render_mode="webgl",
+        labels={
+            "snapshot": "日時",
+            "value": "値",
+            "variable": "指標",
+        },
+        title=f"{category} の配信者数・競争率推移",
+    )
+    fig_stream.update_layout(height=400)
+
+    return fig_view, fig_stream
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_bar_figure(top: pd.DataFrame, ranking_metric: str, top_n: int):
+    """上位カテゴリのバーグラフを作る
+
+    top には描画に使う列だけを渡すので、同じフィルタ条件に戻したときはキャッシュから返る。
+    """
+    fig_bar = px.bar(
+        top,
+        x="カテゴリ",
+        y=ranking_metric,
+        color="成長タイプ",
+        title=f"上位 {top_n} カテゴリの {ranking_metric}",
+        labels={"カテゴリ": "カテゴリ", ranking_metric: ranking_metric, "成長タイプ": "成長タイプ"},
+    )
+    fig_bar.update_layout(xaxis_tickangle=-45, height=500)
+    return fig_bar
+
+
+@st.fragment
+def category_detail(df: pd.DataFrame, filtered: pd.DataFrame):
+    """選択したカテゴリの詳細パネル
+
+    fragment にしてあるので、カテゴリを選び直してもこの中だけ再実行される。
+    """
+    st.subheader("🔍 カテゴリ詳細")
+
+    selected_category = st.selectbox(
+        "詳細を見たいカテゴリを選択",
+        filtered["カテゴリ"].tolist(),
+        index=0,
+    )
+
+    # df は load_history で snapshot 順に並べ済みなので、ここでは並べ直さない
+    df_cat = df[df["name"] == selected_category]
+    cat_summary = filtered[filtered["カテゴリ"] == selected_category].iloc[0]
+
+    # 期間（Timedelta）を計算
+    start_dt = cat_summary["初回取得日時"]
+    end_dt = cat_summary["最新取得日時"]
+    duration = end_dt - start_dt
+    days = duration.days
+    hours = int(duration.total_seconds() // 3600)
+
+    # 上段メトリクス（成長系＋視聴者系）
+    col1, col2, col3 = st.columns(3)
+    col1.metric("成長タイプ", cat_summary["成長タイプ"])
+    col2.metric("成長スコア", f"{cat_summary['成長スコア']:.2f}")
+    col3.metric("視聴者数増加量", int(cat_summary["視聴者数増加量"]))
+
+    col4, col5, col6 = st.columns(3)
+    col4.metric("視聴者増加率", f"{cat_summary['視聴者増加率']:.2f}")
+    col5.metric("ランク改善量（+でランクUP）", int(cat_summary["ランク改善量"]))
+    col6.metric("視聴者のばらつき（標準偏差）", f"{cat_summary['視聴者数標準偏差']:.1f}")
+
+    # 下段メトリクス（最新・累計・平均・競争率・データ数）
+    col7, col8, col9 = st.columns(3)
+    col7.metric("最新視聴者数", int(cat_summary["最新視聴者数"]))
+    col8.metric("累計視聴者数", int(cat_summary["累計視聴者数"]))
+    col9.metric("平均視聴者数", f"{cat_summary['平均視聴者数']:.1f}")
+
+    col10, col11, col12 = st.columns(3)
+    col10.metric("最大視聴者数", int(cat_summary["最大視聴者数"]))
+    col11.metric("平均競争率", f"{cat_summary['平均競争率']:.2f}")
+    col12.metric("データ数（スナップショット数）", int(cat_summary["サンプル数"]))
+
+    # 初回ランク・最新ランク・期間・ピーク情報
+    st.markdown(
+        f"- 初回取得日時：**{start_dt}**（ランク: {int(cat_summary['初回ランク'])}）  \n"
+        f"- 最新取得日時：**{end_dt}**（ランク: {int(cat_summary['最新ランク'])}）  \n"
+        f"- 期間：**約 {days} 日（≒ {hours} 時間）**  \n"
+        f"- ピーク視聴者数：**{int(cat_summary['ピーク視聴者数'])}**"
+        f"（ピーク日時: {cat_summary['ピーク日時']}）"
+    )
+
+    # ---- 推移グラフ ----
+    fig_view, fig_stream = build_trend_figures(df_cat, selected_category)
+
+    st.subheader("📉 視聴者数の推移")
+    st.plotly_chart(fig_view, use_container_width=True)
+
+    st.subheader("📡 配信者数・競争率の推移")
+    st.plotly_chart(fig_stream, use_container_width=True)
+
+    # ---- 生データ ----
+    st.subheader("📄 生データ（このカテゴリの全レコード）")
+    show_raw = df_cat[["snapshot", "rank", "streamers", "viewers", "competition_index"]]
+    show_raw = show_raw.rename(
+        columns={
+            "snapshot": "日時",
+            "rank": "ランク",
+            "streamers": "配信者数",
+            "viewers": "視聴者数",
+            "competition_index": "競争率（視聴÷配信）",
+        }
+    )
+    st.dataframe(show_raw, use_container_width=True)
+
+
 def main():
     st.set_page_config(page_title="Twitch カテゴリ成長分析", layout="wide")
     st.title("📊 Twitch カテゴリ成長分析ダッシュボード")
 
-    df, error_msg = load_history()
+    df, error_msg = load_history(_file_signature())
 
     if error_msg:
         st.error(error_msg)
@@ -268,19 +409,20 @@ def main():
     top_n = st.sidebar.slider("ランキング表示数（上位何カテゴリまで）", 5, 100, 20)
 
     # ---- フィルタ適用 ----
-    filtered = summary.copy()
-    filtered = filtered[filtered["サンプル数"] >= min_samples]
-    filtered = filtered[filtered["累計視聴者数"] >= min_total_viewers]
+    # 条件をひとつのマスクにまとめて、切り出しは1回だけにする
+    mask = (summary["サンプル数"].to_numpy() >= min_samples) & (
+        summary["累計視聴者数"].to_numpy() >= min_total_viewers
+    )
 
     if name_filter.strip():
-        filtered = filtered[filtered["カテゴリ"].str.contains(name_filter, case=False, na=False)]
+        mask &= summary["カテゴリ"].str.contains(name_filter, case=False, na=False).to_numpy()
 
-    if filtered.empty:
+    if not mask.any():
         st.warning("条件に合うカテゴリがありません。フィルタ条件を緩めてください。")
         st.stop()
 
     # ランキング基準でソート（大きいほど良い前提）
-    filtered = filtered.sort_values(ranking_metric, ascending=False).reset_index(drop=True)
+    filtered = summary.loc[mask].sort_values(ranking_metric, ascending=False, ignore_index=True)
     filtered.insert(0, "順位", filtered.index + 1)
 
     # ---- ランキングテーブル ----
@@ -314,15 +456,11 @@ def main():
     # ---- 上位カテゴリのバーグラフ ----
     st.subheader(f"📈 上位カテゴリ（基準：{ranking_metric}）")
 
-    fig_bar = px.bar(
-        filtered.head(top_n),
-        x="カテゴリ",
-        y=ranking_metric,
-        color="成長タイプ",
-        title=f"上位 {top_n} カテゴリの {ranking_metric}",
-        labels={"カテゴリ": "カテゴリ", ranking_metric: ranking_metric, "成長タイプ": "成長タイプ"},
+    fig_bar = build_bar_figure(
+        filtered[["カテゴリ", ranking_metric, "成長タイプ"]].head(top_n),
+        ranking_metric,
+        top_n,
     )
-    fig_bar.update_layout(xaxis_tickangle=-45, height=500)
     st.plotly_chart(fig_bar, use_container_width=True)
 
     # ---- 成長タイプの説明 ----
@@ -338,100 +476,7 @@ def main():
     )
 
     # ---- 選択したカテゴリの詳細 ----
-    st.subheader("🔍 カテゴリ詳細")
-
-    selected_category = st.selectbox(
-        "詳細を見たいカテゴリを選択",
-        filtered["カテゴリ"].tolist(),
-        index=0,
-    )
-
-    df_cat = df[df["name"] == selected_category].sort_values("snapshot")
-    cat_summary = filtered[filtered["カテゴリ"] == selected_category].iloc[0]
-
-    # 期間（Timedelta）を計算
-    start_dt = cat_summary["初回取得日時"]
-    end_dt = cat_summary["最新取得日時"]
-    duration = end_dt - start_dt
-    days = duration.days
-    hours = int(duration.total_seconds() // 3600)
-
-    # 上段メトリクス（成長系＋視聴者系）
-    col1, col2, col3 = st.columns(3)
-    col1.metric("成長タイプ", cat_summary["成長タイプ"])
-    col2.metric("成長スコア", f"{cat_summary['成長スコア']:.2f}")
-    col3.metric("視聴者数増加量", int(cat_summary["視聴者数増加量"]))
-
-    col4, col5, col6 = st.columns(3)
-    col4.metric("視聴者増加率", f"{cat_summary['視聴者増加率']:.2f}")
-    col5.metric("ランク改善量（+でランクUP）", int(cat_summary["ランク改善量"]))
-    col6.metric("視聴者のばらつき（標準偏差）", f"{cat_summary['視聴者数標準偏差']:.1f}")
-
-    # 下段メトリクス（最新・累計・平均・競争率・データ数）
-    col7, col8, col9 = st.columns(3)
-    col7.metric("最新視聴者数", int(cat_summary["最新視聴者数"]))
-    col8.metric("累計視聴者数", int(cat_summary["累計視聴者数"]))
-    col9.metric("平均視聴者数", f"{cat_summary['平均視聴者数']:.1f}")
-
-    col10, col11, col12 = st.columns(3)
-    col10.metric("最大視聴者数", int(cat_summary["最大視聴者数"]))
-    col11.metric("平均競争率", f"{cat_summary['平均競争率']:.2f}")
-    col12.metric("データ数（スナップショット数）", int(cat_summary["サンプル数"]))
-
-    # 初回ランク・最新ランク・期間・ピーク情報
-    st.markdown(
-        f"- 初回取得日時：**{start_dt}**（ランク: {int(cat_summary['初回ランク'])}）  \n"
-        f"- 最新取得日時：**{end_dt}**（ランク: {int(cat_summary['最新ランク'])}）  \n"
-        f"- 期間：**約 {days} 日（≒ {hours} 時間）**  \n"
-        f"- ピーク視聴者数：**{int(cat_summary['ピーク視聴者数'])}**"
-        f"（ピーク日時: {cat_summary['ピーク日時']}）"
-    )
-
-    # ---- 視聴者数の推移グラフ ----
-    st.subheader("📉 視聴者数の推移")
-
-    fig_view = px.line(
-        df_cat,
-        x="snapshot",
-        y="viewers",
-        markers=True,
-        labels={"snapshot": "日時", "viewers": "視聴者数"},
-        title=f"{selected_category} の視聴者数推移",
-    )
-    fig_view.update_layout(height=400)
-    st.plotly_chart(fig_view, use_container_width=True)
-
-    # ---- 配信者数＆競争率の推移グラフ ----
-    st.subheader("📡 配信者数・競争率の推移")
-
-    fig_stream = px.line(
-        df_cat,
-        x="snapshot",
-        y=["streamers", "competition_index"],
-        markers=True,
-        labels={
-            "snapshot": "日時",
-            "value": "値",
-            "variable": "指標",
-        },
-        title=f"{selected_category} の配信者数・競争率推移",
-    )
-    fig_stream.update_layout(height=400)
-    st.plotly_chart(fig_stream, use_container_width=True)
-
-    # ---- 生データ ----
-    st.subheader("📄 生データ（このカテゴリの全レコード）")
-    show_raw = df_cat[["snapshot", "rank", "streamers", "viewers", "competition_index"]]
-    show_raw = show_raw.rename(
-        columns={
-            "snapshot": "日時",
-            "rank": "ランク",
-            "streamers": "配信者数",
-            "viewers": "視聴者数",
-            "competition_index": "競争率（視聴÷配信）",
-        }
-    )
-    st.dataframe(show_raw, use_container_width=True)
+    category_detail(df, filtered)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import csv
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+# dashboard.py / analyze_twitch_history.py で共有する履歴データの読み込みまわり
+
+# 履歴CSVから読むカラム（ファイルによって game_id などの余分な列があっても無視する）
+# 数値は int32 で十分収まるので int64 にせず帯域を半分にする（差分を取るので符号付き）
+# rank だけは "1.0" や "-" のような書き方でも読み込みで落ちないよう文字列で読み、数値化は読む側でする
+CSV_SCHEMA = pa.schema(
+    [
+        ("rank", pa.string()),
+        ("name", pa.string()),
+        ("streamers", pa.int32()),
+        ("viewers", pa.int32()),
+    ]
+)
+# 型推論をせずスキーマの型で直接パースする。空欄のカテゴリ名は pandas.read_csv と同じく欠損扱い
+# （include_columns はデータセット読み込みと併用すると列が重複するので使わず、スキーマ側で列を絞る）
+CSV_FORMAT = ds.CsvFileFormat(
+    convert_options=pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in CSV_SCHEMA},
+        strings_can_be_null=True,
+    )
+)
+# 空欄の配信者数・視聴者数は 0 として扱う（int32 のまま持つため）
+CSV_COUNT_COLUMNS = ["streamers", "viewers"]
+# 1ファイル数KBの CSV が大量にあるので、同時に読み進めるファイル数を多めにとる
+CSV_FRAGMENT_READAHEAD = 16
+
+# twitch_ranking_YYYY-MM-DD_HH-MM.csv の前後の固定部分の長さ（日時部分をスライスで抜く）
+FILENAME_PREFIX_LEN = len("twitch_ranking_")
+FILENAME_SUFFIX_LEN = len(".csv")
+
+
+def history_cache_key(files, mtimes, version):
+    """Parquet キャッシュの有効判定に使うキー（形式バージョン＋全 CSV のファイル名・更新時刻のハッシュ）
+
+    ファイル名の付け直しや古い CSV との差し替えでも、ファイル名か更新時刻のどれかが変わればキーが変わる。
+    """
+    digest = hashlib.sha1()
+    for path, mtime in zip(files, mtimes):
+        digest.update(f"{os.path.basename(path)}\t{mtime!r}\n".encode("utf-8"))
+    return f"v{version}:{digest.hexdigest()}"
+
+
+# 結合済み履歴の Parquet キャッシュは data/ に <cache_name>.parquet と <cache_name>.sig を置く。
+# 呼び出し側ごとに中身（付け足す列など）が違うので、cache_name はスクリプトごとに分け、
+# 返す DataFrame の形を変えたら history_cache_key に渡す version を上げる（古いキャッシュを読まないように）
+
+
+def _history_cache_paths(data_dir, cache_name):
+    """キャッシュ本体（.parquet）とキー（.sig）のパス"""
+    base = os.path.join(data_dir, cache_name)
+    return f"{base}.parquet", f"{base}.sig"
+
+
+def read_history_cache(data_dir, cache_name, key):
+    """キーが一致すれば data/ 内の Parquet キャッシュから結合済みの履歴を読む。使えなければ None"""
+    cache_path, sig_path = _history_cache_paths(data_dir, cache_name)
+    try:
+        with open(sig_path, encoding="utf-8") as f:
+            if f.read() != key:
+                return None
+        return pd.read_parquet(cache_path, engine="pyarrow")
+    except (OSError, pa.ArrowException):
+        return None
+
+
+def write_history_cache(df, data_dir, cache_name, key):
+    """結合済みの履歴を data/ 内の Parquet キャッシュに書く（書けない環境では何もしない）"""
+    cache_path, sig_path = _history_cache_paths(data_dir, cache_name)
+    try:
+        # 書き込み途中で落ちても古いキーで新しい中身を読まないよう、先にキーを消す
+        if os.path.exists(sig_path):
+            os.remove(sig_path)
+        df.to_parquet(cache_path, engine="pyarrow", compression="zstd", index=False)
+        with open(sig_path, "w", encoding="utf-8") as f:
+            f.write(key)
+    except OSError:
+        pass
+
+
+def parse_snapshot_times(files):
+    """twitch_ranking_YYYY-MM-DD_HH-MM.csv の日時部分をまとめて解析する（解釈できないものは NaT）"""
+    tags = [os.path.basename(path)[FILENAME_PREFIX_LEN:-FILENAME_SUFFIX_LEN] for path in files]
+    return pd.to_datetime(tags, format="%Y-%m-%d_%H-%M", errors="coerce")
+
+
+def invalid_snapshot_file(files, snapshots):
+    """日時部分を解釈できなかった最初のファイル名（parse_snapshot_times の結果が NaT のもの）。全部読めれば None"""
+    if not snapshots.hasnans:
+        return None
+    return os.path.basename(files[snapshots.isna().argmax()])
+
+
+def _csv_header(path):
+    """CSV の1行目（カラム名の一覧）"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def scan_history(files, snapshots):
+    """履歴CSVを Arrow のデータセットとして一括で読み、snapshot 列を付けた DataFrame を返す
+
+    snapshots は files と同じ並びの取得日時（parse_snapshot_times の戻り値）。
+    戻り値は snapshot 昇順（同時刻内は CSV の順のまま）で、name はカテゴリ型。
+    必要なカラムが無い CSV があれば ValueError、値をパースできなければ pa.ArrowInvalid を投げる。
+    """
+    snapshot_by_name = dict(zip((os.path.basename(path) for path in files), np.asarray(snapshots)))
+
+    # ファイルをまたいで並列にパースする
+    dataset = ds.dataset(files, format=CSV_FORMAT, schema=CSV_SCHEMA)
+
+    batches = []
+    batch_snapshots = []
+    batch_sizes = []
+    for tagged in dataset.scanner(fragment_readahead=CSV_FRAGMENT_READAHEAD).scan_batches():
+        batch = tagged.record_batch
+        filename = os.path.basename(tagged.fragment.path)
+
+        # スキーマにない列は全行 null になる。そのときだけヘッダーを見て、本当に列が無いのか確かめる
+        # （列はあるが全部空欄、というだけなら欠損値として読み進める）
+        all_null = [c for c in CSV_SCHEMA.names if batch.column(c).null_count == batch.num_rows]
+        missing = set(all_null) - set(_csv_header(tagged.fragment.path)) if all_null else set()
+        if missing:
+            raise ValueError(f"CSV {filename} に必要なカラム {missing} がありません。収集スクリプト側の出力形式を確認してください。")
+
+        batches.append(batch)
+        batch_snapshots.append(snapshot_by_name[filename])
+        batch_sizes.append(batch.num_rows)
+
+    table = pa.Table.from_batches(batches, schema=CSV_SCHEMA)
+    for name in CSV_COUNT_COLUMNS:
+        column = table.column(name)
+        if column.null_count:
+            table = table.set_column(table.schema.get_field_index(name), name, pc.fill_null(column, 0))
+    snapshot = np.repeat(np.array(batch_snapshots, dtype="datetime64[ns]"), batch_sizes)
+    table = table.append_column("snapshot", pa.array(snapshot))
+
+    # 変換しながら Arrow 側のバッファを解放し、ブロック統合のコピーもしない
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    # snapshot 順に一度だけ並べておく（同時刻内の並びは CSV の順のまま）
+    df = df.sort_values("snapshot", kind="mergesort", ignore_index=True)
+    # groupby / isin が文字列ハッシュではなく整数コードで済むようにカテゴリ型にしておく
+    df["name"] = df["name"].astype("category")
+    return df
+
+
+def competition_index(df):
+    """競争率（視聴者 ÷ 配信者）を float32 の配列で返す。配信者0のカテゴリは 0 扱い"""
+    s = df["streamers"].to_numpy()
+    v = df["viewers"].to_numpy()
+    result = np.zeros(len(s), dtype=np.float32)
+    np.divide(v, s, out=result, where=s > 0)
+    return result
@@ -1,9 +1,18 @@
 import csv
+import io
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+import matplotlib
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# PNG に書き出すだけなので GUI バックエンドを探さない
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 # ===== 設定 =====
@@ -11,6 +20,9 @@ BASE_URL = "https://api.twitch.tv/helix"
 TOKEN_URL = "https://id.twitch.tv/oauth2/token"
 
 TOP_GAME_COUNT = 50  # 上位何カテゴリ取るか
+MAX_WORKERS = 8  # カテゴリごとの配信取得を同時に何本走らせるか
+RATE_LIMIT_RETRIES = 5  # レート制限（429）で取り直す回数
+SERVER_ERROR_RETRIES = 5  # 5xx・接続エラーで取り直す回数
 OUTPUT_DIR = "data"
 
 LATEST_CSV_NAME = "twitch_category_ranking_latest.csv"
@@ -38,15 +50,49 @@ def build_headers(client_id: str, access_token: str):
     }
 
 
-def get_top_games(headers, limit=TOP_GAME_COUNT):
+def build_session(client_id: str, access_token: str) -> requests.Session:
+    """Helix 用のセッション（接続を使い回して TLS ハンドシェイクを毎回しない）"""
+    session = requests.Session()
+    session.headers.update(build_headers(client_id, access_token))
+
+    # 429 は helix_get 側で Ratelimit-Reset を見て待つので、ここでは 5xx だけ取り直す
+    retry = Retry(
+        total=SERVER_ERROR_RETRIES,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,  # 並列スレッドの取り直しが同じ瞬間に重ならないように
+        status_forcelist=[500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS, max_retries=retry))
+    return session
+
+
+def helix_get(session, url, params):
+    """Helix API を GET して JSON を返す（レート制限に当たったら解除時刻まで待って取り直す）"""
+    for attempt in range(RATE_LIMIT_RETRIES):
+        res = session.get(url, params=params, timeout=10)
+        if res.status_code != 429:
+            break
+        # 最後の試行で 429 なら、待っても取り直さないのでそのままエラーにする
+        if attempt == RATE_LIMIT_RETRIES - 1:
+            break
+
+        # Ratelimit-Reset はバケットが戻る時刻（UNIX秒）
+        reset = float(res.headers.get("Ratelimit-Reset", 0))
+        time.sleep(max(reset - time.time(), 1))
+
+    res.raise_for_status()
+    # 配信一覧はページあたり100件と大きいので、標準の json より速い orjson でデコード
+    return orjson.loads(res.content)
+
+
+def get_top_games(session, limit=TOP_GAME_COUNT):
     url = f"{BASE_URL}/games/top"
     params = {"first": min(limit, 100)}
     games = []
 
     while len(games) < limit:
-        res = requests.get(url, headers=headers, params=params, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+        data = helix_get(session, url, params)
 
         games.extend(data["data"])
         cursor = data.get("pagination", {}).get("cursor")
@@ -55,12 +101,11 @@ def get_top_games(headers, limit=TOP_GAME_COUNT):
             break
 
         params["after"] = cursor
-        time.sleep(0.2)
 
     return games[:limit]
 
 
-def collect_stream_data(headers, game_id):
+def collect_stream_data(session, game_id):
     """ゲームIDの配信者数と視聴者合計を返す"""
     url = f"{BASE_URL}/streams"
     params = {"game_id": game_id, "first": 100}
@@ -69,16 +114,13 @@ def collect_stream_data(headers, game_id):
     total_viewers = 0
 
     while True:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = helix_get(session, url, params)
 
         streams = data.get("data", [])
         total_streams += len(streams)
 
         # viewer_count 合計
-        for stream in streams:
-            total_viewers += stream.get("viewer_count", 0)
+        total_viewers += sum(stream.get("viewer_count", 0) for stream in streams)
 
         cursor = data.get("pagination", {}).get("cursor")
 
@@ -86,27 +128,39 @@ def collect_stream_data(headers, game_id):
             break
 
         params["after"] = cursor
-        time.sleep(0.2)
 
     return total_streams, total_viewers
 
 
-def build_ranking(headers):
+def build_ranking(session):
     print(f"カテゴリ取得中…（TOP {TOP_GAME_COUNT}）")
-    games = get_top_games(headers)
-
+    games = get_top_games(session)
+
+    # カテゴリごとの取得は互いに独立でほぼ通信待ちなので、スレッドで同時に投げる
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(collect_stream_data, session, game["id"]): game for game in games}
+
+        try:
+            for i, future in enumerate(as_completed(futures), 1):
+                streams, viewers = future.result()
+                print(f"[{i}/{TOP_GAME_COUNT}] {futures[future]['name']} → 配信: {streams} | 視聴者: {viewers}")
+        except BaseException:
+            # 1カテゴリでも失敗したらランキングは作れないので、まだ始まっていない取得は捨てて抜ける
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    # 並びは終わった順ではなく元のカテゴリ順で作る（同数のときの順位がぶれないように）
     ranking = []
 
-    for i, game in enumerate(games, 1):
-        print(f"[{i}/{TOP_GAME_COUNT}] {game['name']} → 取得中…", end="")
-        streams, viewers = collect_stream_data(headers, game["id"])
-        print(f" 配信: {streams} | 視聴者: {viewers}")
+    for future, game in futures.items():
+        streams, viewers = future.result()
 
         ranking.append({
             "name": game["name"],
             "game_id": game["id"],
             "streamers": streams,
             "viewers": viewers,
+            "avg_viewers_per_stream": round(viewers / streams, 2) if streams else 0,
         })
 
     # 視聴者多い順でソート
@@ -116,42 +170,34 @@ def build_ranking(headers):
 
 
 def ensure_dir():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
 def write_csv(ranking, snapshot_tag):
-    ensure_dir()
-
     dated = f"{OUTPUT_DIR}/twitch_ranking_{snapshot_tag}.csv"
     latest = f"{OUTPUT_DIR}/{LATEST_CSV_NAME}"
 
     fields = ["rank", "name", "streamers", "viewers", "avg_viewers_per_stream"]
 
-    def write(path):
-        with open(path, "w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fields)
-            writer.writeheader()
-
-            for i, r in enumerate(ranking, start=1):
-                writer.writerow({
-                    "rank": i,
-                    "name": r["name"],
-                    "streamers": r["streamers"],
-                    "viewers": r["viewers"],
-                    "avg_viewers_per_stream": round(r["viewers"] / r["streamers"], 2) if r["streamers"] else 0
-                })
+    # CSV の文字列化は1回だけにして、同じ中身を2ファイルに書く
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    writer.writerows(
+        [i, r["name"], r["streamers"], r["viewers"], r["avg_viewers_per_stream"]]
+        for i, r in enumerate(ranking, start=1)
+    )
 
-    write(dated)
-    write(latest)
+    text = buf.getvalue()
+    for path in (dated, latest):
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            f.write(text)
 
     print(f"📁 CSV保存 → {dated}")
     print(f"📁 最新CSV更新 → {latest}")
 
 
 def plot_graph(ranking, snapshot_tag, top_n=10):
-    ensure_dir()
-
     top = ranking[:top_n]
 
     names = [x["name"] for x in top]
@@ -168,10 +214,16 @@ def plot_graph(ranking, snapshot_tag, top_n=10):
     dated = f"{OUTPUT_DIR}/twitch_top_categories_{snapshot_tag}.png"
     latest = f"{OUTPUT_DIR}/{LATEST_PNG_NAME}"
 
-    plt.savefig(dated)
-    plt.savefig(latest)
+    # 描画・PNG エンコードは1回だけにして、同じバイト列を2ファイルに書く
+    buf = io.BytesIO()
+    plt.savefig(buf, format="png")
     plt.close()
 
+    png = buf.getvalue()
+    for path in (dated, latest):
+        with open(path, "wb") as f:
+            f.write(png)
+
     print(f"📊 グラフ保存 → {dated}")
     print(f"📊 最新グラフ更新 → {latest}")
 
@@ -188,10 +240,11 @@ def main():
     print(f"🕒 {ts} → データ取得開始")
 
     token = get_app_access_token(cid, secret)
-    headers = build_headers(cid, token)
 
-    ranking = build_ranking(headers)
+    with build_session(cid, token) as session:
+        ranking = build_ranking(session)
 
+    ensure_dir()
     write_csv(ranking, ts)
     plot_graph(ranking, ts)
 